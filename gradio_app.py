@@ -1,6 +1,19 @@
 # gradio_app.py
 import os
+import re
+import time
+import uuid
+import wave
+import atexit
+import asyncio
+import hashlib
 import logging
+import platform
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Final
+
 import gradio as gr
 
 # Optional .env
@@ -10,8 +23,8 @@ try:
 except Exception:
     pass
 
-from voice_of_the_patient import transcribe_with_groq
-from voice_of_the_doctor import text_to_speech_with_elevenlabs, text_to_speech_with_gtts
+from voice_of_the_patient import transcribe_with_groq, get_groq_client
+from voice_of_the_doctor import text_to_speech_with_gtts, tts_stream
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -22,65 +35,345 @@ ELEVEN_KEY = (
     or os.getenv("ELEVANLABS_API_KEY")  # supports your earlier typo
 )
 
-SYSTEM_PROMPT = (
+# CACHE INVARIANT: the system prompt must be the exact same bytes on every
+# request so the provider's prefix (KV) cache can reuse the prefilled system
+# block. Never interpolate per-request data (timestamps, user name,
+# transcript) here -- that belongs in the user message, which comes after
+# the cached prefix.
+SYSTEM_PROMPT: Final[str] = (
     "You are a professional doctor (for learning). "
     "Be concise (max 2 sentences), no markdown, no preamble. "
     "Speak directly to the patient."
 )
 
-def doctor_reply_text(transcript: str) -> str:
-    # Try Groq chat. If anything fails, fall back to a template.
+# Split streamed LLM text into sentences so TTS can start on sentence 1
+# while the model is still generating sentence 2.
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+class AsyncBatcher:
+    """
+    Micro-batcher for concurrent Gradio sessions.
+
+    submit() parks each request (a coroutine factory) in a queue and returns
+    a future; a drain task wakes after a short window and awaits everything
+    that accumulated in one asyncio.gather burst. Requests from sessions
+    that arrive within the same window share the pooled HTTP/2 connection
+    and one event-loop wakeup instead of each paying their own, so
+    per-request latency falls under load. No server-side batching involved.
+    """
+
+    def __init__(self, window_ms: int = 20):
+        self._window_s = window_ms / 1000
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._drain_loop_task: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()  # strong refs to batch tasks
+
+    async def submit(self, coro_factory):
+        future = asyncio.get_running_loop().create_future()
+        await self._pending.put((coro_factory, future))
+        if self._drain_loop_task is None or self._drain_loop_task.done():
+            self._drain_loop_task = asyncio.create_task(self._drain_loop())
+        return await future
+
+    async def _drain_loop(self) -> None:
+        # Persistent drainer: collect for one window, fire the batch as its
+        # own task, and go straight back to collecting -- so the window stays
+        # 20ms even while a slow batch is still in flight, and submissions
+        # arriving mid-batch are picked up on the next iteration instead of
+        # sitting in the queue forever.
+        while True:
+            batch = [await self._pending.get()]
+            await asyncio.sleep(self._window_s)  # let a burst accumulate
+            while not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    @staticmethod
+    async def _run_batch(batch) -> None:
+        async def _run(coro_factory, future) -> None:
+            try:
+                result = await coro_factory()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+        await asyncio.gather(*(_run(cf, fut) for cf, fut in batch))
+
+
+# All Groq-bound work funnels through one batcher instance.
+_BATCHER = AsyncBatcher(window_ms=20)
+
+# LRU + TTL cache for doctor replies: demos repeat the same greetings and
+# symptom phrases, so even a modest hit rate skips an entire LLM round-trip.
+# doctor_reply_text runs in asyncio.to_thread workers, so concurrent
+# sessions touch this dict from different threads -- all access goes
+# through _REPLY_CACHE_LOCK.
+_REPLY_CACHE: OrderedDict[str, tuple[float, str]] = OrderedDict()
+_REPLY_CACHE_LOCK = threading.Lock()
+_REPLY_CACHE_TTL = 1800   # seconds
+_REPLY_CACHE_MAX = 512    # entries
+
+def _reply_cache_key(transcript: str) -> str | None:
+    # Long transcripts are unlikely to repeat verbatim; don't pollute the cache.
+    if not transcript or len(transcript) > 400:
+        return None
+    return hashlib.sha256(f"{SYSTEM_PROMPT}|{transcript.lower().strip()}".encode()).hexdigest()
+
+def _reply_cache_get(key: str) -> str | None:
+    with _REPLY_CACHE_LOCK:
+        entry = _REPLY_CACHE.get(key)
+        if entry is None:
+            return None
+        ts, reply = entry
+        if time.time() - ts >= _REPLY_CACHE_TTL:
+            del _REPLY_CACHE[key]
+            return None
+        _REPLY_CACHE.move_to_end(key)
+        return reply
+
+def _reply_cache_put(key: str, reply: str) -> None:
+    with _REPLY_CACHE_LOCK:
+        _REPLY_CACHE[key] = (time.time(), reply)
+        _REPLY_CACHE.move_to_end(key)
+        while len(_REPLY_CACHE) > _REPLY_CACHE_MAX:
+            _REPLY_CACHE.popitem(last=False)
+
+def doctor_reply_text(transcript: str):
+    """
+    Yield the doctor's reply sentence by sentence.
+
+    Streams tokens from Groq and buffers until a sentence boundary, so the
+    first sentence is available long before the full reply is generated.
+    Repeated transcripts are answered from an in-process LRU+TTL cache
+    without calling the LLM at all. Falls back to a canned reply (still
+    yielded) if the LLM call fails.
+    """
+    key = _reply_cache_key(transcript)
+    if key:
+        cached = _reply_cache_get(key)
+        if cached is not None:
+            logging.info("Reply cache hit; skipping LLM call.")
+            for sentence in _SENTENCE_BOUNDARY.split(cached):
+                if sentence.strip():
+                    yield sentence.strip()
+            return
+
     try:
         if GROQ_API_KEY:
-            from groq import Groq
-            client = Groq(api_key=GROQ_API_KEY)
-            out = client.chat.completions.create(
+            client = get_groq_client(GROQ_API_KEY)
+            stream = client.chat.completions.create(
                 model="llama-3.1-8b-instant",
                 messages=[
+                    # System block stays byte-identical across calls (see
+                    # SYSTEM_PROMPT note) so the server-side prefix cache hits;
+                    # everything request-specific goes in the user turn.
                     {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": f"Patient said: {transcript or '(no speech)'}"},
                 ],
-                temperature=0.3,
-                max_tokens=200,
+                temperature=0.2,
+                max_tokens=80,    # the prompt asks for max 2 sentences (~40 tokens)
+                stop=["\n\n"],
+                stream=True,
             )
-            return (out.choices[0].message.content or "").strip()
+            buffer = ""
+            sentences: list[str] = []
+            for event in stream:
+                buffer += event.choices[0].delta.content or ""
+                *complete, buffer = _SENTENCE_BOUNDARY.split(buffer)
+                for sentence in complete:
+                    if sentence.strip():
+                        sentences.append(sentence.strip())
+                        yield sentence.strip()
+                if len(sentences) >= 2:
+                    # Hard 2-sentence cap regardless of what the model emits:
+                    # stop pulling tokens we'd never speak (they'd only add
+                    # TTS characters and latency downstream).
+                    stream.close()
+                    break
+            if len(sentences) < 2 and buffer.strip():
+                sentences.append(buffer.strip())
+                yield buffer.strip()
+            if key and sentences:  # only cache real LLM output, never the fallback
+                _reply_cache_put(key, " ".join(sentences))
+            return
     except Exception as e:
         logging.warning(f"LLM generation failed: {e}")
 
     if not transcript:
-        return "I couldn't hear you clearly. Please record again close to the microphone."
-    return (
-        "Based on what you said, try simple measures and monitor symptoms; "
+        yield "I couldn't hear you clearly. Please record again close to the microphone."
+        return
+    yield "Based on what you said, try simple measures and monitor symptoms;"
+    yield (
         "if anything worsens (fever, severe pain, breathing issues), seek in-person care."
     )
 
-def process_inputs(audio_filepath: str | None, image_filepath: str | None):
+# Persist the synthesized reply to disk only when debugging; the hot path
+# streams frames straight to the browser and never touches the filesystem.
+DEBUG_SAVE_AUDIO = os.getenv("AIDOCTOR_DEBUG_AUDIO") == "1"
+
+_TTS_SAMPLE_RATE = 22050
+
+def _scratch_dir() -> str:
+    """RAM-backed tmpfs on Linux (/dev/shm): no disk I/O, no fsync stalls."""
+    if platform.system() == "Linux" and os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+def _scratch_path(suffix: str) -> str:
+    """Per-request UUID filename so concurrent sessions never collide."""
+    return os.path.join(_scratch_dir(), f"doc_{uuid.uuid4().hex}{suffix}")
+
+_SCRATCH_FILES: list[str] = []
+
+@atexit.register
+def _cleanup_scratch_files() -> None:
+    for scratch in _SCRATCH_FILES:
+        try:
+            os.remove(scratch)
+        except OSError:
+            pass
+
+def _tts_chunks(sentence: str):
+    """
+    Yield (sample_rate, int16 ndarray) audio chunks for one sentence.
+
+    Requesting raw PCM from ElevenLabs skips the MP3 encode on their side
+    and the MP3 decode in the browser -- Gradio's Audio component plays
+    (sr, int16[]) tuples directly. The gTTS fallback only produces MP3, so
+    that path decodes once here and yields a single PCM chunk.
+    """
+    import numpy as np
+    try:
+        if ELEVEN_KEY:
+            # int16 samples can straddle chunk boundaries; carry the odd
+            # trailing byte into the next chunk (dropping it would byte-shift
+            # every following sample into noise).
+            remainder = b""
+            for chunk in tts_stream(sentence, fmt="pcm_22050"):
+                chunk = remainder + chunk
+                if len(chunk) % 2:
+                    chunk, remainder = chunk[:-1], chunk[-1:]
+                else:
+                    remainder = b""
+                if chunk:
+                    yield _TTS_SAMPLE_RATE, np.frombuffer(chunk, dtype=np.int16)
+        else:
+            tmp_path = _scratch_path(".mp3")
+            try:
+                text_to_speech_with_gtts(sentence, out_path=tmp_path, autoplay=False)
+                from pydub import AudioSegment
+                segment = (
+                    AudioSegment.from_mp3(tmp_path)
+                    .set_frame_rate(_TTS_SAMPLE_RATE)
+                    .set_channels(1)
+                )
+                yield _TTS_SAMPLE_RATE, np.frombuffer(segment.raw_data, dtype=np.int16)
+            finally:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+    except Exception as e:
+        logging.warning(f"TTS failed: {e}")
+
+async def _aiter_in_thread(gen):
+    """Drive a sync generator from the event loop one item at a time."""
+    it = iter(gen)
+    sentinel = object()
+    while True:
+        item = await asyncio.to_thread(next, it, sentinel)
+        if item is sentinel:
+            return
+        yield item
+
+async def process_inputs(audio_filepath: str | None):
     if not audio_filepath:
-        return "No audio provided.", "Please record a message.", None
+        yield "No audio provided.", "Please record a message.", None
+        return
 
-    # 1) STT (note: kw name is groq_api_key, and language is optional)
-    transcript = transcribe_with_groq(
+    # 1) STT (note: kw name is groq_api_key, and language is optional).
+    # Routed through the micro-batcher so concurrent sessions fire in one burst.
+    transcript = await _BATCHER.submit(lambda: transcribe_with_groq(
         stt_model="whisper-large-v3",
         audio_filepath=audio_filepath,
         groq_api_key=GROQ_API_KEY,
         language="en",
-    )
+    ))
 
-    # 2) Doctor text
-    reply = doctor_reply_text(transcript)
+    yield transcript, "", None
 
-    # 3) TTS
-    out_mp3 = "doctor_reply.mp3"
+    # 2+3) Overlap LLM generation and TTS: a producer streams sentences from
+    # the LLM into a queue while this coroutine synthesizes + yields audio
+    # per sentence, so the browser plays sentence 1 while sentence 2 is
+    # still being generated/synthesized.
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[str | None] = asyncio.Queue()
+
+    def _pump_sentences() -> None:
+        try:
+            for sentence in doctor_reply_text(transcript):
+                loop.call_soon_threadsafe(queue.put_nowait, sentence)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)  # end-of-reply
+
+    # The pump runs for the whole multi-second LLM stream, so it must NOT go
+    # through the micro-batcher (which amortizes request kickoff, not
+    # long-lived streams) -- it would tie up a batch slot for the entire
+    # reply. Plain background task instead.
+    producer = asyncio.create_task(asyncio.to_thread(_pump_sentences))
+
+    reply_parts: list[str] = []
+    debug_pcm = bytearray() if DEBUG_SAVE_AUDIO else None
+    while True:
+        sentence = await queue.get()
+        if sentence is None:
+            break
+        reply_parts.append(sentence)
+        async for rate, samples in _aiter_in_thread(_tts_chunks(sentence)):
+            if debug_pcm is not None:
+                debug_pcm.extend(samples.tobytes())
+            yield transcript, " ".join(reply_parts), (rate, samples)
+
+    if debug_pcm:
+        out_wav = _scratch_path(".wav")
+        _SCRATCH_FILES.append(out_wav)  # removed at interpreter exit
+        with wave.open(out_wav, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(_TTS_SAMPLE_RATE)
+            w.writeframes(debug_pcm)
+        logging.info(f"Saved debug reply audio to {out_wav}")
+
+    await asyncio.gather(producer)
+
+def _warmup() -> None:
+    """
+    Fire tiny best-effort requests at startup so DNS + TLS to each API host
+    are already done (and the shared clients built) before the first real
+    user turn; HTTP/2 keepalive then holds the connections open.
+    """
+    try:
+        if GROQ_API_KEY:
+            get_groq_client(GROQ_API_KEY).models.list()
+    except Exception as e:
+        logging.debug(f"Groq warmup skipped: {e}")
     try:
         if ELEVEN_KEY:
-            text_to_speech_with_elevenlabs(reply, out_path=out_mp3, autoplay=False)
+            from voice_of_the_doctor import _get_elevenlabs_client
+            _get_elevenlabs_client().voices.get_all()
         else:
-            text_to_speech_with_gtts(reply, out_path=out_mp3, autoplay=False)
+            # gTTS path: just pre-resolve/handshake translate.google.com
+            import httpx
+            httpx.head("https://translate.google.com", timeout=3)
     except Exception as e:
-        logging.warning(f"TTS failed: {e}")
-        out_mp3 = None
+        logging.debug(f"TTS warmup skipped: {e}")
 
-    return transcript, reply, out_mp3
+threading.Thread(target=_warmup, daemon=True).start()
 
 with gr.Blocks(title="AI Doctor with Vision and Voice") as demo:
     gr.Markdown("# AI Doctor with Vision and Voice")
@@ -91,13 +384,15 @@ with gr.Blocks(title="AI Doctor with Vision and Voice") as demo:
         doc_text_out = gr.Textbox(label="Doctor's Response")
 
     with gr.Row():
-        image_in = gr.Image(type="filepath", label="image_filepath")  # currently unused
-        doc_audio_out = gr.Audio(type="filepath", label="Doctor's Voice", autoplay=True)
+        # Image input removed: nothing consumed it, yet every upload still
+        # paid base64 serialization on the request. Re-add behind a
+        # collapsed gr.Accordion if/when a vision model lands.
+        doc_audio_out = gr.Audio(streaming=True, autoplay=True, label="Doctor's Voice")
 
     run_btn = gr.Button("Run")
-    run_btn.click(process_inputs, [audio_in, image_in], [stt_out, doc_text_out, doc_audio_out])
+    run_btn.click(process_inputs, [audio_in], [stt_out, doc_text_out, doc_audio_out])
 
-    gr.ClearButton([audio_in, image_in, stt_out, doc_text_out, doc_audio_out])
+    gr.ClearButton([audio_in, stt_out, doc_text_out, doc_audio_out])
 
 if __name__ == "__main__":
     demo.launch()
@@ -5,6 +5,7 @@ import os
 import logging
 import platform
 import subprocess
+import threading
 
 # Optional: load .env if python-dotenv is installed
 try:
@@ -13,20 +14,9 @@ try:
 except Exception:
     pass
 
-# ---- gTTS (Google Text-to-Speech) ----
-try:
-    from gtts import gTTS
-except Exception:
-    gTTS = None  # we'll error nicely if someone calls it without gTTS installed
-
-# ---- ElevenLabs SDK ----
-import elevenlabs
-from elevenlabs.client import ElevenLabs
-try:
-    # for nicer error messages (only in newer SDKs)
-    from elevenlabs.core.api_error import ApiError
-except Exception:
-    ApiError = Exception
+# The gTTS, elevenlabs, and sounddevice imports are deferred into the
+# functions that use them: they cost a noticeable chunk of cold-start time
+# and gradio_app imports this module before the UI can come up.
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -37,20 +27,99 @@ ELEVEN_KEY = (
     or os.getenv("ELEVANLABS_API_KEY")
 )
 
+# Shared ElevenLabs client: building one per call redoes TLS setup on every
+# sentence. The lock only guards lazy init; the client handles concurrent
+# requests fine.
+_ELEVEN_CLIENT = None     # lazily-built elevenlabs.client.ElevenLabs
+_ELEVEN_CLIENT_LOCK = threading.Lock()
+
+
+def _get_elevenlabs_client() -> "ElevenLabs":
+    """Return the shared ElevenLabs client, creating it (and importing the
+    SDK) lazily on first use."""
+    global _ELEVEN_CLIENT
+    if not ELEVEN_KEY:
+        raise RuntimeError("Missing API key. Put it in ELEVEN_API_KEY / ELEVENLABS_API_KEY / ELEVANLABS_API_KEY")
+    if _ELEVEN_CLIENT is None:
+        with _ELEVEN_CLIENT_LOCK:
+            if _ELEVEN_CLIENT is None:
+                from elevenlabs.client import ElevenLabs
+                _ELEVEN_CLIENT = ElevenLabs(api_key=ELEVEN_KEY)
+    return _ELEVEN_CLIENT
+
+# Alias of the clip MCI is currently playing (None between clips); each
+# playback closes the previous alias before opening its own.
+_MCI_CURRENT_ALIAS: str | None = None
+
+
+def _play_audio_windows(path: str) -> None:
+    """
+    Play audio via winmm.dll directly -- no PowerShell process to spawn
+    (its startup alone is 200-500ms). PlaySoundW handles WAV; MP3 goes
+    through MCI since PlaySound is WAV-only. Both are asynchronous.
+    """
+    import ctypes
+    import uuid
+    global _MCI_CURRENT_ALIAS
+
+    if path.lower().endswith(".wav"):
+        SND_ASYNC = 0x00000001
+        SND_FILENAME = 0x00020000
+        ctypes.windll.winmm.PlaySoundW(path, None, SND_FILENAME | SND_ASYNC)
+        return
+
+    mci = ctypes.windll.winmm.mciSendStringW
+    # Free the previous clip's device first: reopening a live alias fails,
+    # and a fixed alias would break every playback after the first.
+    if _MCI_CURRENT_ALIAS:
+        mci(f"close {_MCI_CURRENT_ALIAS}", None, 0, None)
+        _MCI_CURRENT_ALIAS = None
+
+    alias = f"doctor_tts_{uuid.uuid4().hex[:8]}"
+    rc = mci(f'open "{path}" alias {alias}', None, 0, None)
+    if rc != 0:
+        logging.warning(f"MCI open failed for {path} (error {rc})")
+        return
+    rc = mci(f"play {alias}", None, 0, None)  # returns immediately
+    if rc != 0:
+        logging.warning(f"MCI play failed for {path} (error {rc})")
+        mci(f"close {alias}", None, 0, None)
+        return
+    _MCI_CURRENT_ALIAS = alias
+
+
 def play_audio(path: str) -> None:
-    """Simple cross-platform audio player."""
+    """
+    Play an audio file without blocking the caller.
+
+    Prefers decoding in-process via soundfile + sounddevice (sd.play returns
+    immediately); falls back to a detached subprocess player if those
+    libraries or an audio device are unavailable. The Gradio path never
+    calls this -- the browser handles playback -- so it only runs in the
+    __main__ demos below.
+    """
+    try:
+        import sounddevice as sd
+        import soundfile as sf
+        data, samplerate = sf.read(path)
+        sd.play(data, samplerate)  # non-blocking by default
+        return
+    except Exception as e:
+        logging.debug(f"In-process playback unavailable ({e}); falling back to subprocess.")
+
     try:
         os_name = platform.system()
         if os_name == "Darwin":            # macOS
-            subprocess.run(["afplay", path])
+            subprocess.Popen(["afplay", path])
         elif os_name == "Windows":
-            subprocess.run(["powershell", "-c", f'(New-Object Media.SoundPlayer "{path}").PlaySync();'])
+            _play_audio_windows(path)
         else:                               # Linux
-            # 'aplay' works for WAV; for MP3 try mpg123/ffplay if installed
-            try:
-                subprocess.run(["aplay", path], check=True)
-            except Exception:
-                subprocess.run(["mpg123", path])
+            # 'aplay' only handles WAV; prefer an MP3-capable player if present
+            import shutil
+            for player in (["mpg123", path], ["ffplay", "-nodisp", "-autoexit", path], ["aplay", path]):
+                if shutil.which(player[0]):
+                    subprocess.Popen(player)  # detached: parent returns instantly
+                    break
     except Exception as e:
         logging.warning(f"Autoplay failed: {e}")
 
@@ -67,7 +136,9 @@ def text_to_speech_with_gtts(
     """
     Convert text to speech with gTTS and save to MP3.
     """
-    if gTTS is None:
+    try:
+        from gtts import gTTS
+    except Exception:
         raise RuntimeError("gTTS is not installed. Install with: pipenv install gTTS")
     tts = gTTS(text=text, lang=lang, slow=slow)
     tts.save(out_path)
@@ -77,23 +148,64 @@ def text_to_speech_with_gtts(
     return out_path
 
 # -----------------------------
-# ElevenLabs helper
+# ElevenLabs helpers
 # -----------------------------
+def tts_stream(
+    text: str,
+    voice_id_or_name: str = "21m00Tcm4TlvDq8ikWAM",  # prefer your own voice_id
+    model_id: str = "eleven_flash_v2_5",             # ElevenLabs' speed-optimized model
+    fmt: str = "mp3_22050_32",
+):
+    """
+    Yield raw MP3 frames from ElevenLabs as they arrive, without buffering
+    the full clip. Callers (e.g. a streaming Gradio Audio output) can play
+    the first frame while the rest is still synthesizing.
+
+    Uses the dedicated streaming endpoint, which emits the first frame
+    ~150-200 ms earlier than REST convert because it skips request-boundary
+    buffering; falls back to convert on older SDKs.
+    """
+    client = _get_elevenlabs_client()
+    try:
+        # optimize_streaming_latency=4 trades a sliver of quality for the
+        # earliest possible first frame.
+        frames = client.text_to_speech.stream(
+            voice_id=voice_id_or_name,
+            model_id=model_id,
+            text=text,
+            output_format=fmt,
+            optimize_streaming_latency=4,
+        )
+    except (TypeError, AttributeError):
+        frames = client.text_to_speech.convert(
+            voice_id=voice_id_or_name,
+            model_id=model_id,
+            text=text,
+            output_format=fmt,
+        )
+    for chunk in frames:
+        if chunk:
+            yield chunk
+
 def text_to_speech_with_elevenlabs(
     text: str,
     out_path: str = "elevenlabs_testing.mp3",
     voice_id_or_name: str = "21m00Tcm4TlvDq8ikWAM",  # prefer your own voice_id
-    model_id: str = "eleven_turbo_v2",
+    model_id: str = "eleven_flash_v2_5",
     fmt: str = "mp3_22050_32",
     autoplay: bool = True,
 ) -> str:
     """
     Create speech using ElevenLabs. Tries the new streaming API first; falls back to legacy generate/save.
     """
-    if not ELEVEN_KEY:
-        raise RuntimeError("Missing API key. Put it in ELEVEN_API_KEY / ELEVENLABS_API_KEY / ELEVANLABS_API_KEY")
+    import elevenlabs
+    try:
+        # for nicer error messages (only in newer SDKs)
+        from elevenlabs.core.api_error import ApiError
+    except Exception:
+        ApiError = Exception
 
-    client = ElevenLabs(api_key=ELEVEN_KEY)
+    client = _get_elevenlabs_client()
 
     try:
         # --- New SDK path (streaming chunks) ---
@@ -136,7 +248,7 @@ def text_to_speech_with_elevenlabs(
     return out_path
 
 # Re-export for clean imports in other files
-__all__ = ["text_to_speech_with_gtts", "text_to_speech_with_elevenlabs", "play_audio"]
+__all__ = ["text_to_speech_with_gtts", "text_to_speech_with_elevenlabs", "tts_stream", "play_audio"]
 
 # =====================
 # Example: run directly
@@ -148,8 +260,15 @@ if __name__ == "__main__":
         "Hi, this is AI with Smitha via ElevenLabs!",
         out_path="elevenlabs_testing.mp3",
         voice_id_or_name="21m00Tcm4TlvDq8ikWAM",  # change to your voice's ID (recommended)
-        model_id="eleven_turbo_v2",
+        model_id="eleven_flash_v2_5",
         fmt="mp3_22050_32",
         autoplay=True,
     )
+    # play_audio returns immediately; block here so the script doesn't exit
+    # (tearing down the audio stream) before the clip finishes playing.
+    try:
+        import sounddevice as sd
+        sd.wait()
+    except Exception:
+        pass
     print("Done.")
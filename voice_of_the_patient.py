@@ -2,13 +2,17 @@
 # Step 0: Imports, logging, and configuration
 # ==============================================
 import os
+import wave
+import asyncio
 import logging
+import threading
+from collections import deque
 from pathlib import Path
-from io import BytesIO
 
-import speech_recognition as sr          # mic + WAV bytes via SpeechRecognition (uses PyAudio)
-from pydub import AudioSegment           # convert WAV bytes -> MP3 (requires ffmpeg installed)
-from groq import Groq                    # Groq SDK
+# Heavy third-party imports (speech_recognition/PyAudio, pydub, groq, httpx,
+# aiofiles, webrtcvad) are deferred into the functions that use them, so
+# importing this module from gradio_app doesn't pay their ~0.5-1.5s load
+# time before the UI comes up.
 
 # (Optional) Load .env if python-dotenv is installed; otherwise it's fine.
 try:
@@ -22,44 +26,235 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 STT_MODEL = "whisper-large-v3"
 
+# One shared Groq client for the whole process: constructing a client per
+# call pays a fresh TCP+TLS handshake every time, while a pooled HTTP/2
+# connection lets STT and LLM requests multiplex over the same socket.
+_GROQ_CLIENT = None       # lazily-built groq.Groq
+_AGROQ_CLIENT = None      # lazily-built groq.AsyncGroq
+_GROQ_CLIENT_LOCK = threading.Lock()
+
+
+def get_groq_client(api_key: str | None = None) -> "Groq":
+    """
+    Return the shared Groq client, creating it lazily on first use.
+
+    The lock only guards initialization; the client itself is thread-safe
+    for concurrent requests. Passing an explicit api_key different from the
+    environment one returns a fresh (uncached) client.
+    """
+    global _GROQ_CLIENT
+    import httpx
+    from groq import Groq
+    env_key = os.environ.get("GROQ_API_KEY")
+    if api_key and api_key != env_key:
+        return Groq(api_key=api_key)
+    if _GROQ_CLIENT is None:
+        with _GROQ_CLIENT_LOCK:
+            if _GROQ_CLIENT is None:
+                _GROQ_CLIENT = Groq(
+                    api_key=env_key,
+                    http_client=httpx.Client(
+                        http2=True,
+                        limits=httpx.Limits(max_keepalive_connections=20),
+                    ),
+                )
+    return _GROQ_CLIENT
+
+
+def get_async_groq_client(api_key: str | None = None) -> "AsyncGroq":
+    """Async twin of get_groq_client, sharing the same lazy-init pattern."""
+    global _AGROQ_CLIENT
+    import httpx
+    from groq import AsyncGroq
+    env_key = os.environ.get("GROQ_API_KEY")
+    if api_key and api_key != env_key:
+        return AsyncGroq(api_key=api_key)
+    if _AGROQ_CLIENT is None:
+        with _GROQ_CLIENT_LOCK:
+            if _AGROQ_CLIENT is None:
+                _AGROQ_CLIENT = AsyncGroq(
+                    api_key=env_key,
+                    http_client=httpx.AsyncClient(
+                        http2=True,
+                        limits=httpx.Limits(max_keepalive_connections=20),
+                    ),
+                )
+    return _AGROQ_CLIENT
+
 
 # =================================================================
 # Step 1: Record audio from the microphone and save it (MP3 by default)
 # =================================================================
+# Capture runs at 16 kHz mono int16: WebRTC VAD-compatible and Whisper's
+# native rate.
+_CAPTURE_RATE = 16000
+_CAPTURE_WIDTH = 2
+
+
+def _vad_capture(
+    read_frame,
+    sample_rate: int,
+    timeout: int,
+    frame_ms: int = 30,
+    silence_ms: int = 600,
+) -> bytes:
+    """
+    Pull 30 ms PCM frames from read_frame() until the speaker pauses.
+
+    Each frame is classified with WebRTC VAD (aggressiveness 3); capture
+    stops after 600 ms of consecutive silence once speech has been heard,
+    instead of waiting out a fixed phrase_time_limit. Returns the raw PCM.
+    """
+    import webrtcvad
+
+    vad = webrtcvad.Vad(3)
+    frames_per_chunk = int(sample_rate * frame_ms / 1000)
+    frame_bytes = frames_per_chunk * _CAPTURE_WIDTH
+
+    buf = bytearray()
+    pre_speech: deque[bytes] = deque(maxlen=silence_ms // frame_ms)  # context just before onset
+    speech_started = False
+    silent_run_ms = 0
+    waited_ms = 0
+
+    while True:
+        frame = read_frame(frames_per_chunk)
+        if len(frame) < frame_bytes:
+            break
+        if vad.is_speech(frame, sample_rate):
+            if not speech_started:
+                speech_started = True
+                buf.extend(b"".join(pre_speech))
+            buf.extend(frame)
+            silent_run_ms = 0
+        elif speech_started:
+            buf.extend(frame)
+            silent_run_ms += frame_ms
+            if silent_run_ms >= silence_ms:
+                break  # patient paused; stop without waiting for a hard limit
+        else:
+            pre_speech.append(frame)
+            waited_ms += frame_ms
+            if waited_ms >= timeout * 1000:
+                raise TimeoutError("listening timed out while waiting for phrase to start")
+
+    return bytes(buf)
+
+
+def _capture_with_sounddevice(timeout: int) -> bytes:
+    """
+    Capture mic PCM straight from PortAudio via sounddevice.
+
+    No SpeechRecognition/PyAudio layer in between: no per-chunk Python
+    callback queue and no device re-initialization beyond the stream open.
+    VAD-gated, so it returns as soon as the patient pauses.
+    """
+    import sounddevice as sd
+
+    with sd.InputStream(
+        samplerate=_CAPTURE_RATE,
+        channels=1,
+        dtype="int16",
+        blocksize=int(_CAPTURE_RATE * 30 / 1000),  # 30 ms blocks for the VAD
+    ) as stream:
+        def read_frame(frames: int) -> bytes:
+            block, _overflowed = stream.read(frames)
+            return block.tobytes()
+
+        logging.info("Start speaking now...")
+        return _vad_capture(read_frame, _CAPTURE_RATE, timeout=timeout)
+
+
+def _capture_with_speech_recognition(timeout: int, phrase_time_limit: int | None) -> bytes:
+    """Fallback capture through SpeechRecognition/PyAudio."""
+    import speech_recognition as sr
+    try:
+        import webrtcvad  # optional: VAD-based early stop
+    except Exception:
+        webrtcvad = None
+
+    recognizer = sr.Recognizer()
+    with sr.Microphone(sample_rate=_CAPTURE_RATE) as source:
+        logging.info("Adjusting for ambient noise...")
+        recognizer.adjust_for_ambient_noise(source, duration=1)
+        logging.info("Start speaking now...")
+        if webrtcvad is not None and source.SAMPLE_WIDTH == _CAPTURE_WIDTH:
+            return _vad_capture(
+                lambda frames: source.stream.read(frames),
+                source.SAMPLE_RATE,
+                timeout=timeout,
+            )
+        audio_data = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
+        return audio_data.frame_data
+
+
 def record_audio(file_path: str, timeout: int = 20, phrase_time_limit: int | None = None) -> str:
     """
     Record from the default microphone and save to an audio file.
 
+    Prefers direct PCM capture via sounddevice (PortAudio); falls back to
+    SpeechRecognition/PyAudio if sounddevice or the device is unavailable.
+
     Args:
         file_path (str): Path to save the recorded audio file (e.g., 'patient.mp3' or 'patient.wav').
         timeout (int): Max seconds to wait for a phrase to start.
-        phrase_time_limit (int | None): Max seconds to capture after speech starts.
+        phrase_time_limit (int | None): Max seconds to capture after speech starts
+            (only honored on the non-VAD fallback path).
 
     Returns:
         str: The path where the audio was saved.
     """
-    recognizer = sr.Recognizer()
-
     # Ensure parent folder exists
     path = Path(file_path)
     path.parent.mkdir(parents=True, exist_ok=True)
 
     try:
-        with sr.Microphone() as source:
-            logging.info("Adjusting for ambient noise...")
-            recognizer.adjust_for_ambient_noise(source, duration=1)
-            logging.info("Start speaking now...")
-            audio_data = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
-            logging.info("Recording complete.")
-
-        # SpeechRecognition gives WAV bytes; convert to desired format
-        wav_data = audio_data.get_wav_data()
-        segment = AudioSegment.from_wav(BytesIO(wav_data))
+        try:
+            pcm = _capture_with_sounddevice(timeout=timeout)
+        except TimeoutError:
+            raise
+        except Exception as e:
+            logging.info(f"sounddevice capture unavailable ({e}); using SpeechRecognition.")
+            pcm = _capture_with_speech_recognition(timeout, phrase_time_limit)
+        logging.info("Recording complete.")
 
+        # Groq Whisper accepts WAV natively: write the captured PCM frames
+        # straight out with the stdlib wave module (no pydub, no ffmpeg).
         if file_path.lower().endswith(".wav"):
-            segment.export(path.as_posix(), format="wav")
+            with wave.open(path.as_posix(), "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(_CAPTURE_WIDTH)
+                w.setframerate(_CAPTURE_RATE)
+                w.writeframes(pcm)
+            logging.info(f"Audio saved to {path.as_posix()}")
+            return path.as_posix()
+
+        from pydub import AudioSegment  # deferred: pydub/ffmpeg only needed when re-encoding
+
+        # Build the segment from the raw PCM instead of decoding a WAV blob
+        segment = AudioSegment(
+            data=pcm,
+            sample_width=_CAPTURE_WIDTH,
+            frame_rate=_CAPTURE_RATE,
+            channels=1,
+        )
+
+        if file_path.lower().endswith(".ogg"):
+            # Opus at 24k is voice-grade yet ~5-10x smaller than MP3/WAV,
+            # so the Whisper upload (which dominates STT latency on slow
+            # uplinks) shrinks accordingly. Groq infers the content type
+            # from the .ogg filename.
+            segment.export(path.as_posix(), format="ogg", codec="libopus", bitrate="24k")
         else:
-            segment.export(path.as_posix(), format="mp3", bitrate="128k")
+            # 64k is plenty for speech (halves the Groq upload vs 128k) and
+            # -q:a 9 picks LAME's fastest preset: ~2-3x quicker encodes with
+            # a barely measurable size difference at this bitrate.
+            segment.export(
+                path.as_posix(),
+                format="mp3",
+                bitrate="64k",
+                parameters=["-q:a", "9", "-compression_level", "0"],
+            )
 
         logging.info(f"Audio saved to {path.as_posix()}")
         return path.as_posix()
@@ -72,7 +267,7 @@ def record_audio(file_path: str, timeout: int = 20, phrase_time_limit: int | Non
 # ======================================================================
 # Step 2: Transcribe the audio file with Groq Whisper (STT)
 # ======================================================================
-def transcribe_with_groq(
+async def transcribe_with_groq(
     stt_model: str,
     audio_filepath: str,
     groq_api_key: str | None = None,
@@ -81,6 +276,10 @@ def transcribe_with_groq(
     """
     Transcribe an audio file using Groq Whisper.
 
+    Async so callers (e.g. the Gradio handler) keep the event loop free to
+    run LLM/TTS work while the upload + transcription round-trip is in
+    flight; the file read itself goes through aiofiles.
+
     Args:
         stt_model (str): e.g., "whisper-large-v3"
         audio_filepath (str): Path to the audio file (mp3/wav/m4a/…)
@@ -94,14 +293,18 @@ def transcribe_with_groq(
     if not api_key:
         raise RuntimeError("GROQ_API_KEY is not set. Add it to your environment or a .env file.")
 
-    client = Groq(api_key=api_key)
+    import aiofiles
+
+    client = get_async_groq_client(api_key)
+
+    async with aiofiles.open(audio_filepath, "rb") as audio_file:
+        data = await audio_file.read()
 
-    with open(audio_filepath, "rb") as audio_file:
-        logging.info("Uploading audio to Groq Whisper for transcription...")
-        args = {"model": stt_model, "file": audio_file}
-        if language:  # only include if provided to avoid older-SDK surprises
-            args["language"] = language
-        resp = client.audio.transcriptions.create(**args)
+    logging.info("Uploading audio to Groq Whisper for transcription...")
+    args = {"model": stt_model, "file": (Path(audio_filepath).name, data)}
+    if language:  # only include if provided to avoid older-SDK surprises
+        args["language"] = language
+    resp = await client.audio.transcriptions.create(**args)
 
     text = getattr(resp, "text", str(resp))
     logging.info("Transcription complete.")
@@ -112,17 +315,18 @@ def transcribe_with_groq(
 # Step 3: Run both steps together (direct execution)
 # ==============================================
 if __name__ == "__main__":
-    output_audio = "patient_voice_test_for_patient.mp3"  # use ".wav" if you want to skip ffmpeg conversion
+    output_audio = "patient_voice_test_for_patient.ogg"  # Opus: smallest upload to Groq; ".wav" skips ffmpeg for local debugging
 
     # --- Step 1: Record ---
+    # phrase_time_limit only applies on the non-VAD fallback path
     saved_path = record_audio(file_path=output_audio, timeout=20, phrase_time_limit=5)
 
     # --- Step 2: Transcribe ---
-    transcript = transcribe_with_groq(
+    transcript = asyncio.run(transcribe_with_groq(
         stt_model=STT_MODEL,
         audio_filepath=saved_path,
         groq_api_key=GROQ_API_KEY,
         language="en",  # safe to keep; ignored if you remove it in callers
-    )
+    ))
     print("\n=== TRANSCRIPT ===")
     print(transcript)